@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+KEYS = ['MaterialTicker', 'ExchangeCode']
+
+
+def last_daily_snapshots(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keep the last snapshot collected on each day, dropping negative prices and counts like create_plots does
+    :param df: raw bids or orders table
+    :return:
+    """
+    df = df[(df['ItemCost'] >= 0) & (df['ItemCount'] > 0)]
+    timestamps = pd.to_datetime(df['collection_timestamp'], utc=True)
+    # UTC midnight as day key, stays vectorised where .dt.date builds python objects
+    dates = timestamps.dt.floor("D")
+    last = timestamps.groupby(dates).transform('max')
+    df = df.loc[timestamps == last, KEYS + ['ItemCost', 'ItemCount']]
+    return df.assign(Date=dates[timestamps == last])
+
+
+def best_prices(df: pd.DataFrame, side: str) -> pd.DataFrame:
+    """
+    Best price and depth per day, ticker and exchange
+    :param df: output of last_daily_snapshots
+    :param side: "bid" (highest price wins) or "ask" (lowest price wins)
+    :return: frame indexed by Date, MaterialTicker, ExchangeCode
+    """
+    grouped = df.groupby(['Date'] + KEYS, sort=False)
+    best = grouped['ItemCost'].max() if side == "bid" else grouped['ItemCost'].min()
+    return pd.DataFrame({f'best_{side}': best, f'{side}_depth': grouped['ItemCount'].sum()})
+
+
+def book_summary(bids: pd.DataFrame, orders: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per ticker and exchange book summary of the latest day with day-over-day change of the mid price.
+    :param bids: raw temporary_df_hold_bids
+    :param orders: raw temporary_df_hold_orders (sell side)
+    :return: one row per MaterialTicker/ExchangeCode
+    """
+    book = best_prices(last_daily_snapshots(bids), "bid").join(
+        best_prices(last_daily_snapshots(orders), "ask"), how="outer")
+    book['spread'] = book['best_ask'] - book['best_bid']
+    book['mid'] = (book['best_ask'] + book['best_bid']) / 2
+    book['spread_pct'] = book['spread'] / book['mid'] * 100
+
+    dates = book.index.get_level_values('Date').unique().sort_values()
+    latest = book.xs(dates[-1], level='Date')
+    if len(dates) > 1:
+        previous_mid = book.xs(dates[-2], level='Date')['mid']
+        latest = latest.assign(mid_change=latest['mid'] - previous_mid.reindex(latest.index))
+    else:
+        latest = latest.assign(mid_change=np.nan)
+    latest['mid_change_pct'] = latest['mid_change'] / (latest['mid'] - latest['mid_change']) * 100
+    return latest.assign(snapshot_date=dates[-1].date()).reset_index()
+
+
+def crossed_volume(ask_prices: np.ndarray, ask_counts: np.ndarray,
+                   bid_prices: np.ndarray, bid_counts: np.ndarray) -> int:
+    """
+    Items that can be bought from the asks and sold to the bids at a profit, matching the cheapest asks with
+    the highest bids while the ask is below the bid
+    :param ask_prices: sell orders of the buy exchange, ascending
+    :param ask_counts:
+    :param bid_prices: buy orders of the sell exchange, descending
+    :param bid_counts:
+    :return:
+    """
+    ask_counts, bid_counts = ask_counts.copy(), bid_counts.copy()
+    volume, i, j = 0, 0, 0
+    while i < len(ask_prices) and j < len(bid_prices) and ask_prices[i] < bid_prices[j]:
+        traded = min(ask_counts[i], bid_counts[j])
+        volume += traded
+        ask_counts[i] -= traded
+        bid_counts[j] -= traded
+        if ask_counts[i] == 0:
+            i += 1
+        if bid_counts[j] == 0:
+            j += 1
+    return int(volume)
+
+
+def arbitrage(summary: pd.DataFrame, bids: pd.DataFrame, orders: pd.DataFrame) -> pd.DataFrame:
+    """
+    Best cross-exchange trade per ticker: buy at the lowest ask, sell at the highest bid
+    :param summary: output of book_summary
+    :param bids: raw temporary_df_hold_bids the summary was computed from
+    :param orders: raw temporary_df_hold_orders the summary was computed from
+    :return: one row per MaterialTicker, profit > 0 means an open arbitrage and volume is the item count
+             tradable at a profit between the two exchanges (0 otherwise)
+    """
+    asks = summary.dropna(subset=['best_ask'])
+    bids_summary = summary.dropna(subset=['best_bid'])
+    buy = asks.loc[asks.groupby('MaterialTicker')['best_ask'].idxmin(),
+                   ['MaterialTicker', 'ExchangeCode', 'best_ask', 'ask_depth']]
+    sell = bids_summary.loc[bids_summary.groupby('MaterialTicker')['best_bid'].idxmax(),
+                            ['MaterialTicker', 'ExchangeCode', 'best_bid', 'bid_depth']]
+    result = buy.merge(sell, on='MaterialTicker', suffixes=('_buy', '_sell'))
+    result = result.rename(columns={'ExchangeCode_buy': 'buy_exchange', 'ExchangeCode_sell': 'sell_exchange'})
+    result['profit'] = result['best_bid'] - result['best_ask']
+    result['profit_pct'] = result['profit'] / result['best_ask'] * 100
+
+    volume = pd.Series(0, index=result.index)
+    open_trades = result[result['profit'] > 0]
+    if len(open_trades):
+        # only the latest snapshot of the tickers with an open arbitrage, few rows
+        snapshot_date = pd.Timestamp(summary['snapshot_date'].iloc[0], tz="UTC")
+        tickers = set(open_trades['MaterialTicker'])
+        books = []
+        for snapshots, ascending in ((last_daily_snapshots(orders), True), (last_daily_snapshots(bids), False)):
+            book = snapshots[(snapshots['Date'] == snapshot_date) & snapshots['MaterialTicker'].isin(tickers)]
+            book = book.sort_values('ItemCost', ascending=ascending)
+            # row positions per ticker and exchange, in price order
+            books.append((book.groupby(KEYS).indices, book['ItemCost'].to_numpy(), book['ItemCount'].to_numpy()))
+        (ask_rows, ask_prices, ask_counts), (bid_rows, bid_prices, bid_counts) = books
+        for index, ticker, buy_exchange, sell_exchange in zip(open_trades.index, open_trades['MaterialTicker'],
+                                                              open_trades['buy_exchange'],
+                                                              open_trades['sell_exchange']):
+            asks_rows, bids_rows = ask_rows[(ticker, buy_exchange)], bid_rows[(ticker, sell_exchange)]
+            volume[index] = crossed_volume(ask_prices[asks_rows], ask_counts[asks_rows],
+                                           bid_prices[bids_rows], bid_counts[bids_rows])
+    result['volume'] = volume
+    return result
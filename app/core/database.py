@@ -0,0 +1,81 @@
+import logging
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, create_engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from core.metrics import TimedQueuePool
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = "prun_data"
+
+
+@lru_cache(maxsize=None)
+def get_engine(url: str) -> Engine:
+    """
+    One pooled engine per database url for the whole process, instead of one engine per request.
+    Queue pools are instrumented for the /metrics endpoint.
+    SQLite urls (benchmarks, local runs) get the database attached a second time as prun_data so the
+    schema qualified queries keep working.
+    :param url: sqlalchemy database url
+    :return:
+    """
+    parsed_url = make_url(url)
+    if parsed_url.get_dialect().get_pool_class(parsed_url) is QueuePool:
+        engine = create_engine(url, poolclass=TimedQueuePool)
+        engine.pool.database = os.path.basename(parsed_url.database or "")
+    else:
+        engine = create_engine(url)
+    if engine.dialect.name == "sqlite":
+        database = engine.url.database or ":memory:"
+
+        @event.listens_for(engine, "connect")
+        def attach_schema(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"ATTACH DATABASE '{database}' AS {SCHEMA}")
+    return engine
+
+
+# DB_INSERT_USERNAME_PASSWORD is not required, the server may not ask for one
+WRITER_VARIABLES = ["DB_INSERT_USERNAME", "DB_HOSTNAME", "DB_PORT", "DB_INSERT_DATABASE"]
+
+
+def writer_configured() -> bool:
+    """
+    Whether writer_url points at a configured database: PRUN_DATABASE_URL or the DB_INSERT_* variables are set
+    """
+    load_dotenv(dotenv_path=".env")
+    return bool(os.environ.get("PRUN_DATABASE_URL")) or all(os.environ.get(name) for name in WRITER_VARIABLES)
+
+
+def writer_url() -> str:
+    """
+    Url of the user allowed to write into prun_data (DB_INSERT_* variables, also read from .env).
+    PRUN_DATABASE_URL, set by the benchmarks and the load test, takes precedence
+    :return:
+    """
+    load_dotenv(dotenv_path=".env")
+    url = os.environ.get("PRUN_DATABASE_URL")
+    if url:
+        return url
+    return (f"postgresql+psycopg2://{os.getenv('DB_INSERT_USERNAME')}:{os.getenv('DB_INSERT_USERNAME_PASSWORD')}"
+            f"@{os.getenv('DB_HOSTNAME')}:{os.getenv('DB_PORT')}/{os.getenv('DB_INSERT_DATABASE')}")
+
+
+def reader_url(host_variable: str = "PG_HOST", port_variable: str = "PG_PORT") -> str:
+    """
+    Url of the read only user (PG_* variables). PRUN_DATABASE_URL, set by the benchmarks and the load test,
+    takes precedence
+    :param host_variable: environment variable holding the host
+    :param port_variable: environment variable holding the port
+    :return:
+    """
+    url = os.environ.get("PRUN_DATABASE_URL")
+    if url:
+        return url
+    return (f"postgresql+psycopg2://{os.environ.get('PG_USER')}:{os.environ.get('PG_PASSWORD')}"
+            f"@{os.environ.get(host_variable)}:{os.environ.get(port_variable)}/{os.environ.get('PG_DATABASE')}")
@@ -0,0 +1,265 @@
+import asyncio
+import itertools
+import json
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.engine import Engine
+
+from core.metrics import EVENT_SUBSCRIBERS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TOPICS = {"ingestion", "prices"}
+
+
+class Subscription:
+    """
+    One connected client: the topics it listens to and a bounded queue of already formatted messages
+    """
+    __slots__ = ("topics", "queue")
+
+    def __init__(self, topics: set[str], queue_size: int):
+        self.topics = topics
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+
+
+class Broker:
+    """
+    In-process fan-out of server-sent events. Each message is serialised once and the same string is handed
+    to every subscriber, so idle subscribers only cost a queue and a suspended coroutine. Slow subscribers
+    lose their oldest messages instead of holding up the publisher.
+    Events reach the brokers of the other workers through PostgreSQL notifications, see notify and listen.
+    """
+
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self.subscriptions: set[Subscription] = set()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, topics: set[str]) -> Subscription:
+        subscription = Subscription(topics, self.queue_size)
+        self.subscriptions.add(subscription)
+        EVENT_SUBSCRIBERS.inc()
+        logger.info(f"New subscriber for {sorted(topics)}, {len(self.subscriptions)} connected")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+            EVENT_SUBSCRIBERS.dec()
+
+    def has_subscribers(self, topic: str) -> bool:
+        return any(topic in subscription.topics for subscription in self.subscriptions)
+
+    def publish(self, topic: str, event: str, data: dict) -> int:
+        """
+        Send an event to every subscriber of topic
+        :return: number of subscribers reached
+        """
+        message = f"id: {next(self._ids)}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        reached = 0
+        for subscription in self.subscriptions:
+            if topic not in subscription.topics:
+                continue
+            if subscription.queue.full():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(message)
+            reached += 1
+        return reached
+
+
+broker = Broker()
+
+# notification channel shared by every worker, payloads are limited to 8000 bytes by PostgreSQL
+CHANNEL = "prun_events"
+PRICE_DELTAS_PER_EVENT = 50
+
+# best prices of the last bids/orders snapshot this worker ingested, with its collection timestamp
+_last_best_prices: dict[str, tuple[datetime, "pd.Series"]] = {}
+
+
+def notify(engine: Engine, topic: str, event: str, data: dict) -> None:
+    """
+    Publish an event to the subscribers of every worker: through pg_notify on PostgreSQL, where each worker
+    listens (see listen), or straight to this worker's broker on other databases
+    """
+    if engine.dialect.name != "postgresql":
+        broker.publish(topic, event, data)
+        return
+    payload = json.dumps({"topic": topic, "event": event, "data": data}, default=str)
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+
+def _listen_connection(url: str):
+    from core.database import get_engine
+
+    engine = get_engine(url)
+    # a dedicated driver connection, it stays out of the pool for the life of the worker
+    args, kwargs = engine.dialect.create_connect_args(engine.url)
+    connection = engine.dialect.connect(*args, **kwargs)
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute(f"LISTEN {CHANNEL}")
+    return connection
+
+
+def _dispatch(payload: str) -> None:
+    try:
+        message = json.loads(payload)
+        broker.publish(message["topic"], message["event"], message["data"])
+    except (ValueError, KeyError) as e:
+        logger.error(f"Ignoring malformed notification on {CHANNEL}: {e}")
+
+
+async def listen(url: str, retry_seconds: float = 5, max_retry_seconds: float = 300) -> None:
+    """
+    Feed the notifications of CHANNEL to this worker's broker, reconnecting when the connection drops.
+    Runs as a background task of every worker for as long as the app runs.
+    :param url: database the ingestion writes to, notifications are scoped to one database
+    :param retry_seconds: first delay before reconnecting, doubled after each failed attempt
+    :param max_retry_seconds: longest delay between attempts
+    """
+    loop = asyncio.get_running_loop()
+    delay = retry_seconds
+    while True:
+        try:
+            connection = await loop.run_in_executor(None, _listen_connection, url)
+        except Exception as e:
+            logger.error(f"Could not listen on {CHANNEL}: {e}, retrying in {delay:g}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_retry_seconds)
+            continue
+        logger.info(f"Listening on {CHANNEL}")
+        delay = retry_seconds
+        lost = loop.create_future()
+
+        def on_readable():
+            try:
+                connection.poll()
+            except Exception as e:
+                if not lost.done():
+                    lost.set_result(e)
+                return
+            while connection.notifies:
+                _dispatch(connection.notifies.pop(0).payload)
+
+        fileno = connection.fileno()
+        loop.add_reader(fileno, on_readable)
+        try:
+            logger.error(f"Lost the connection listening on {CHANNEL}: {await lost}, reconnecting")
+        finally:
+            loop.remove_reader(fileno)
+            connection.close()
+        await asyncio.sleep(retry_seconds)
+
+
+_listener: asyncio.Task | None = None
+
+
+async def start_listener() -> None:
+    """
+    Startup hook: listen for events on PostgreSQL, other databases only deliver events within the worker.
+    Nothing is started when no writer database is configured.
+    """
+    global _listener
+    from core.database import writer_configured, writer_url
+
+    if not writer_configured():
+        logger.warning(f"No writer database configured, not listening on {CHANNEL}")
+        return
+    url = writer_url()
+    if url.startswith("postgresql"):
+        _listener = asyncio.create_task(listen(url))
+
+
+async def stop_listener() -> None:
+    if _listener is not None:
+        _listener.cancel()
+
+
+def _best_prices(dataframe: "pd.DataFrame", side: str) -> "pd.Series":
+    from core import analytics
+
+    return analytics.best_prices(analytics.last_daily_snapshots(dataframe), side)[f'best_{side}'].droplevel('Date')
+
+
+def _previous_best_prices(engine: Engine, table_name: str, side: str,
+                          collection_timestamp: datetime, cached) -> "pd.Series | None":
+    """
+    Best prices of the snapshot ingested before collection_timestamp, looked up within today and yesterday.
+    The snapshot kept in memory is only reused when it is that one: the previous run may have been ingested
+    by another worker.
+    """
+    import pandas as pd
+
+    from core import partitions
+
+    table = f'{partitions.SCHEMA}."{table_name}"'
+    # typed parameters so SQLite compares them in the format the timestamps were stored in
+    stmt = text(f"SELECT max({partitions.PARTITION_COLUMN}) FROM {table} "
+                f"WHERE {partitions.PARTITION_COLUMN} >= :since AND {partitions.PARTITION_COLUMN} < :current"
+                ).bindparams(bindparam("since", type_=DateTime()), bindparam("current", type_=DateTime()))
+    with engine.connect() as connection:
+        previous = connection.execute(stmt, {"since": partitions.recent_window_start(2),
+                                             "current": collection_timestamp}).scalar()
+        if previous is None:
+            return None
+        if cached is not None and pd.Timestamp(cached[0]) == pd.Timestamp(previous):
+            return cached[1]
+        snapshot = pd.read_sql(text(f'SELECT "MaterialTicker", "ExchangeCode", "ItemCost", "ItemCount", '
+                                    f'{partitions.PARTITION_COLUMN} FROM {table} '
+                                    f'WHERE {partitions.PARTITION_COLUMN} = :previous'),
+                               connection, params={"previous": previous})
+    return _best_prices(snapshot, side)
+
+
+def publish_table_loaded(engine: Engine, table_name: str, dataframe: "pd.DataFrame",
+                         collection_timestamp: datetime) -> dict:
+    """
+    Announce a table appended by the ingestion and, for bids and orders, the per ticker price changes.
+    The version of a table is the collection timestamp of its latest snapshot, the same in every worker
+    and across restarts.
+    :return: the row count and version recorded for the run summary
+    """
+    loaded = {"rows": len(dataframe), "version": collection_timestamp.isoformat()}
+    # the rows are already appended, a failure to announce them must not fail the ingestion
+    try:
+        _publish_table_loaded(engine, table_name, dataframe, collection_timestamp, loaded)
+    except Exception as error:
+        logger.error(f"Error while publishing events for {table_name}, {error}")
+    return loaded
+
+
+def _publish_table_loaded(engine: Engine, table_name: str, dataframe: "pd.DataFrame",
+                          collection_timestamp: datetime, loaded: dict) -> None:
+    notify(engine, "ingestion", "table", {"table": table_name, **loaded})
+
+    side = {"temporary_df_hold_bids": "bid", "temporary_df_hold_orders": "ask"}.get(table_name)
+    if side is None:
+        return
+    import pandas as pd
+
+    best = _best_prices(dataframe, side)
+    cached = _last_best_prices.get(table_name)
+    _last_best_prices[table_name] = (collection_timestamp, best)
+    # subscribers of the other workers are unknown, only local delivery can be skipped
+    if engine.dialect.name != "postgresql" and not broker.has_subscribers("prices"):
+        return
+    previous = _previous_best_prices(engine, table_name, side, collection_timestamp, cached)
+    if previous is None:
+        return
+    change = best - previous.reindex(best.index)
+    moved = change.isna() | change.ne(0)
+    deltas = [{"ticker": ticker, "exchange": exchange, "side": side, "price": price,
+               "change": None if pd.isna(delta) else delta}
+              for (ticker, exchange), price, delta in zip(best.index[moved], best[moved], change[moved])]
+    for start in range(0, len(deltas), PRICE_DELTAS_PER_EVENT):
+        notify(engine, "prices", "prices", {"table": table_name, "version": loaded["version"],
+                                            "deltas": deltas[start:start + PRICE_DELTAS_PER_EVENT]})
@@ -0,0 +1,54 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from sqlalchemy.engine import Engine
+
+from core import partitions
+from core.events import publish_table_loaded
+from core.logging_config import lazy
+from core.metrics import INGESTION_DURATION, INGESTION_ROWS
+
+logger = logging.getLogger(__name__)
+
+
+def load_csv(engine: Engine, api_name: str, csv_text: str) -> dict:
+    """
+    Parse one FIO csv export, stamp it with the collection time and append it to
+    prun_data.temporary_df_hold_<api_name>
+    :param engine: engine of the user allowed to write into prun_data
+    :param api_name: FIO csv endpoint name, ex: bids
+    :param csv_text: body of the FIO response
+    :return: row count and version of the table
+    """
+    import pandas as pd
+
+    current_time = datetime.now().strftime("%d-%m-%Y-%H-%M")
+    data = StringIO(csv_text)
+    destination_filename = f"{current_time}-{api_name}.csv"
+    with INGESTION_DURATION.labels(api_name, "parse").time():
+        dataframe = pd.read_csv(data)
+    pandas_type_dataframe = dataframe
+    # optional but in use now for my own purposes
+    timezone_gmt_plus_two = timezone(timedelta(hours=+2))
+    collection_timestamp = datetime.now(tz=timezone_gmt_plus_two)
+    pandas_type_dataframe["collection_timestamp"] = collection_timestamp
+    logger.debug("Head of %s\n%s", destination_filename, lazy(dataframe.head))
+    # serialize into string for easier archivation and later parsing down the road
+    # currently keeping it in html because CSV had massive problems
+    # only used for debugging for now, so only rendered when debug logging is enabled
+    logger.debug("Archive entry %s, %s rows\n%s", destination_filename, len(dataframe), lazy(dataframe.to_html))
+
+    table_name = f"temporary_df_hold_{api_name}"
+    with INGESTION_DURATION.labels(api_name, "load").time():
+        partitions.prepare_partitions(engine, table_name, pandas_type_dataframe)
+        logger.info(msg="Dataframe uploaded to sql")
+        pandas_type_dataframe.to_sql(
+            name=table_name,
+            con=engine, schema=partitions.SCHEMA,
+            if_exists="append",
+            index=False
+        )
+    INGESTION_ROWS.labels(api_name).inc(len(pandas_type_dataframe))
+    logger.info(msg=f"Dataframe uploaded to proper table for api {api_name}")
+    return publish_table_loaded(engine, table_name, pandas_type_dataframe, collection_timestamp)
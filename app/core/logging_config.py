@@ -0,0 +1,146 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# attributes every LogRecord has, anything else was passed through `extra` and goes into the json record.
+# color_message is uvicorn's ANSI colored copy of the message template.
+_RECORD_ATTRIBUTES = (set(vars(logging.LogRecord("", 0, "", 0, "", None, None)))
+                      | {"message", "asctime", "taskName", "color_message"})
+
+_listener: QueueListener | None = None
+
+# uvicorn installs its own stdout handlers before importing the app, and uvicorn.access does not propagate
+UVICORN_LOGGERS = ["uvicorn", "uvicorn.error", "uvicorn.access"]
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One json object per line: time, level, logger, message, source location, extras and traceback
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _BackgroundQueueHandler(QueueHandler):
+    """
+    Resolves the message in the calling thread, so mutable arguments are captured as they were, and leaves
+    formatting and I/O to the listener thread
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class lazy:
+    """
+    Defers an expensive log payload until a handler actually formats the record:
+        logger.debug("Loaded %s\\n%s", filename, lazy(data.head))
+    Nothing is computed when the level is disabled.
+    """
+    __slots__ = ("function", "args")
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def __str__(self) -> str:
+        return str(self.function(*self.args))
+
+
+def parse_levels(levels: str) -> dict[str, str]:
+    """
+    LOG_LEVELS format: comma separated logger=LEVEL pairs, ex: routes.reports=DEBUG,core.partitions=WARNING
+    """
+    parsed = {}
+    for part in levels.split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            parsed[name.strip()] = level.strip().upper()
+    return parsed
+
+
+def configure_logging() -> None:
+    """
+    Route every logger, uvicorn's included, through a queue drained by a background thread writing to LOG_FILE
+    (default log.log) and stdout, so request latency does not depend on disk or stdout speed. Idempotent.
+
+    LOG_LEVEL: root level, INFO by default
+    LOG_LEVELS: per logger levels, see parse_levels
+    LOG_FORMAT: json (default) or text
+    LOG_STDOUT: 0 to only write to LOG_FILE
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    if os.environ.get("LOG_FORMAT", "json") == "text":
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    else:
+        formatter = JsonFormatter()
+    handlers = []
+    if os.environ.get("LOG_STDOUT", "1") != "0":
+        handlers.append(logging.StreamHandler(sys.stdout))
+    log_file = os.environ.get("LOG_FILE", "log.log")
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_BackgroundQueueHandler(log_queue))
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        for handler in uvicorn_logger.handlers[:]:
+            uvicorn_logger.removeHandler(handler)
+        uvicorn_logger.propagate = True
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    for name, level in parse_levels(os.environ.get("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """
+    Flush the queue and stop the background writer, registered with atexit. Whatever is logged afterwards
+    is written directly by the same handlers.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            if isinstance(handler, _BackgroundQueueHandler):
+                root.removeHandler(handler)
+        for handler in _listener.handlers:
+            root.addHandler(handler)
+        _listener = None
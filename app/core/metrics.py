@@ -0,0 +1,163 @@
+import logging
+import os
+import random
+import time
+
+from fastapi import Response
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               generate_latest, multiprocess)
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.util import queue as sqla_queue
+
+logger = logging.getLogger(__name__)
+
+# request latencies range from a redirect to a full table export
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency per route",
+                            ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being processed", multiprocess_mode="livesum")
+EVENT_SUBSCRIBERS = Gauge("events_subscribers", "Clients connected to /events", multiprocess_mode="livesum")
+
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out of the pool", ["database"])
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out", ["database"],
+                            multiprocess_mode="livesum")
+DB_POOL_WAIT = Histogram("db_pool_wait_seconds",
+                         "Time spent waiting for a pooled connection, opening new connections excluded", ["database"])
+
+INGESTION_DURATION = Histogram("ingestion_stage_duration_seconds", "Ingestion time per FIO endpoint and stage",
+                               ["endpoint", "stage"], buckets=LATENCY_BUCKETS)
+INGESTION_ROWS = Counter("ingestion_rows_total", "Rows appended per FIO endpoint", ["endpoint"])
+
+REPORT_RENDER = Histogram("report_render_duration_seconds", "Time to render the plots of one ticker",
+                          ["source"], buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+
+# optional sampling profiler for slow requests, needs pyinstrument
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_REQUEST_MS", 0))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.05))
+Profiler = None
+if PROFILE_SLOW_MS:
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        logger.warning("PROFILE_SLOW_REQUEST_MS is set but pyinstrument is not installed, profiling disabled")
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+class _TimedQueue(sqla_queue.Queue):
+    """
+    Queue of idle connections timing how long each checkout waits on it. Connections opened because the
+    queue was empty are not part of the wait.
+    """
+
+    database = ""
+
+    def get(self, block=True, timeout=None):
+        start = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            DB_POOL_WAIT.labels(self.database).observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool recording checkouts, connections in use and the time spent waiting for an idle connection
+    """
+
+    _queue_class = _TimedQueue
+
+    @property
+    def database(self) -> str:
+        """
+        Label of the metrics, set by get_engine
+        """
+        return self._pool.database
+
+    @database.setter
+    def database(self, value: str) -> None:
+        self._pool.database = value
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.database = self.database
+        return pool
+
+    def _do_get(self):
+        record = super()._do_get()
+        DB_POOL_CHECKOUTS.labels(self.database).inc()
+        DB_POOL_CHECKED_OUT.labels(self.database).inc()
+        return record
+
+    def _do_return_conn(self, record):
+        DB_POOL_CHECKED_OUT.labels(self.database).dec()
+        super()._do_return_conn(record)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency per route template (not per url, to keep the label set bounded) and
+    requests in flight. A request lasts until the last chunk of its body is sent, so streamed responses
+    (table exports) are measured for their whole duration. Server-sent event streams are left out, their
+    duration is the lifetime of a subscriber: see EVENT_SUBSCRIBERS.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profiler = None
+        if PROFILE_SLOW_MS and Profiler is not None and random.random() < PROFILE_SAMPLE_RATE:
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        status = 500
+        finished = None
+        event_stream = False
+
+        async def send_and_measure(message):
+            nonlocal status, finished, event_stream
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if content_type.startswith(b"text/event-stream"):
+                    event_stream = True
+                    REQUESTS_IN_FLIGHT.dec()
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            # requests ending without a complete body (errors, disconnected clients) count until now
+            elapsed = (finished or time.perf_counter()) - start
+            if not event_stream:
+                REQUESTS_IN_FLIGHT.dec()
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(elapsed)
+            if profiler is not None:
+                profiler.stop()
+                if not event_stream and elapsed * 1000 >= PROFILE_SLOW_MS:
+                    logger.warning(f"Slow request {scope['method']} {scope['path']} took {elapsed:.3f}s\n"
+                                   f"{profiler.output_text(unicode=False, color=False)}")
+
+
+def metrics_response() -> Response:
+    """
+    Prometheus exposition of this process, or of every worker when PROMETHEUS_MULTIPROC_DIR is set
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
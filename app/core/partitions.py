@@ -0,0 +1,277 @@
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = "prun_data"
+PARTITION_COLUMN = "collection_timestamp"
+ROLLUP_SUFFIX = "_daily"
+LEGACY_SUFFIX = "_legacy"
+DEFAULT_RETENTION_DAYS = 30
+
+
+def retention_days() -> int:
+    """
+    Retention horizon in days for raw partitions, read from PRUN_RETENTION_DAYS
+    :return:
+    """
+    try:
+        return int(os.environ.get("PRUN_RETENTION_DAYS", DEFAULT_RETENTION_DAYS))
+    except ValueError:
+        logger.error(f"Invalid PRUN_RETENTION_DAYS, falling back to {DEFAULT_RETENTION_DAYS}")
+        return DEFAULT_RETENTION_DAYS
+
+
+def partition_name(table_name: str, day: date) -> str:
+    return f"{table_name}_p{day:%Y%m%d}"
+
+
+def recent_window_start(days: int) -> datetime:
+    """
+    Start of a window covering the last `days` calendar days (UTC), today included.
+    Aligned on partition boundaries so days=1 only touches today's partition.
+    :param days:
+    :return:
+    """
+    today = datetime.now(tz=timezone.utc).date()
+    return datetime.combine(today - timedelta(days=max(days, 1) - 1), time.min, tzinfo=timezone.utc)
+
+
+def _relation_kind(connection: Connection, name: str) -> str | None:
+    """
+    Return the pg_class relkind of prun_data.<name>: 'p' partitioned, 'r' plain table, None if missing
+    """
+    stmt = text("SELECT c.relkind FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = :schema AND c.relname = :name")
+    return connection.execute(stmt, {"schema": SCHEMA, "name": name}).scalar()
+
+
+def _create_indexes(connection: Connection, table_name: str, columns) -> None:
+    # BRIN suits the append-in-time-order layout, btree serves per ticker lookups
+    connection.execute(text(f'CREATE INDEX IF NOT EXISTS "{table_name}_ts_brin" '
+                            f'ON {SCHEMA}."{table_name}" USING brin ({PARTITION_COLUMN})'))
+    if "MaterialTicker" in columns:
+        connection.execute(text(f'CREATE INDEX IF NOT EXISTS "{table_name}_ticker_ts_idx" '
+                                f'ON {SCHEMA}."{table_name}" ("MaterialTicker", {PARTITION_COLUMN})'))
+
+
+def ensure_partition(connection: Connection, table_name: str, day: date) -> str:
+    """
+    Create the daily partition of table_name holding `day` (UTC) if it does not exist yet
+    :return: partition name
+    """
+    name = partition_name(table_name, day)
+    lower = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    upper = lower + timedelta(days=1)
+    connection.execute(text(f'CREATE TABLE IF NOT EXISTS {SCHEMA}."{name}" '
+                            f'PARTITION OF {SCHEMA}."{table_name}" '
+                            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"))
+    return name
+
+
+def ensure_partitioned_table(connection: Connection, table_name: str, dataframe: "pd.DataFrame") -> bool:
+    """
+    Make sure prun_data.<table_name> exists as a table partitioned by range on collection_timestamp.
+    Missing tables are created from the dataframe schema; tables predating partitioning are left alone
+    (see convert_legacy_table).
+    :return: True if the table is partitioned
+    """
+    import pandas as pd
+
+    kind = _relation_kind(connection, table_name)
+    if kind == "p":
+        return True
+    if kind is not None:
+        logger.warning(f"{SCHEMA}.{table_name} is not partitioned, appending without partition management")
+        return False
+
+    create_statement = pd.io.sql.get_schema(dataframe, table_name, con=connection, schema=SCHEMA).rstrip()
+    connection.execute(text(f"{create_statement} PARTITION BY RANGE ({PARTITION_COLUMN})"))
+    _create_indexes(connection, table_name, dataframe.columns)
+    logger.info(f"Created partitioned table {SCHEMA}.{table_name}")
+    return True
+
+
+def has_rollup(connection: Connection, table_name: str) -> bool:
+    """
+    Whether compact_partitions already moved days of prun_data.<table_name> into its daily rollup
+    """
+    return inspect(connection).has_table(f"{table_name}{ROLLUP_SUFFIX}", schema=SCHEMA)
+
+
+def history_source(connection: Connection, table_name: str) -> str:
+    """
+    FROM clause over the whole history of prun_data.<table_name>: the daily rollup of the compacted days
+    followed by the raw table
+    """
+    raw = f'{SCHEMA}."{table_name}"'
+    if not has_rollup(connection, table_name):
+        return raw
+    return f'(SELECT * FROM {SCHEMA}."{table_name}{ROLLUP_SUFFIX}" UNION ALL SELECT * FROM {raw}) AS history'
+
+
+def prepare_partitions(engine: Engine, table_name: str, dataframe: "pd.DataFrame") -> None:
+    """
+    Called before appending a freshly downloaded dataframe: creates the partitioned parent and the
+    partitions needed for the rows' collection timestamps. No-op outside PostgreSQL.
+    """
+    if engine.dialect.name != "postgresql" or PARTITION_COLUMN not in dataframe.columns:
+        return
+    import pandas as pd
+
+    days = pd.to_datetime(dataframe[PARTITION_COLUMN], utc=True).dt.date.dropna().unique()
+    with engine.begin() as connection:
+        if not ensure_partitioned_table(connection, table_name, dataframe):
+            return
+        for day in days:
+            ensure_partition(connection, table_name, day)
+
+
+def list_partitions(connection: Connection, table_name: str) -> list[tuple[str, date]]:
+    """
+    Daily partitions attached to prun_data.<table_name>, oldest first
+    """
+    stmt = text("SELECT child.relname FROM pg_inherits i "
+                "JOIN pg_class parent ON parent.oid = i.inhparent "
+                "JOIN pg_class child ON child.oid = i.inhrelid "
+                "JOIN pg_namespace n ON n.oid = parent.relnamespace "
+                "WHERE n.nspname = :schema AND parent.relname = :name")
+    prefix = f"{table_name}_p"
+    partitions = []
+    for (name,) in connection.execute(stmt, {"schema": SCHEMA, "name": table_name}):
+        try:
+            partitions.append((name, datetime.strptime(name[len(prefix):], "%Y%m%d").date()))
+        except ValueError:
+            logger.warning(f"Skipping partition {name}, name does not carry a date")
+    partitions.sort(key=lambda partition: partition[1])
+    return partitions
+
+
+def compact_partitions(engine: Engine, table_name: str, days: int | None = None) -> list[str]:
+    """
+    Compact raw partitions older than the retention horizon into daily rollups and drop them.
+    The rollup keeps the last snapshot collected on each day in prun_data.<table_name>_daily.
+    :param engine:
+    :param table_name:
+    :param days: retention horizon, defaults to PRUN_RETENTION_DAYS
+    :return: names of the dropped partitions
+    """
+    horizon = recent_window_start(retention_days() if days is None else days).date()
+    rollup_name = f"{table_name}{ROLLUP_SUFFIX}"
+    dropped = []
+    with engine.begin() as connection:
+        if _relation_kind(connection, table_name) != "p":
+            logger.warning(f"{SCHEMA}.{table_name} is not partitioned, nothing to compact")
+            return dropped
+        partitions = [partition for partition in list_partitions(connection, table_name) if partition[1] < horizon]
+        if partitions:
+            connection.execute(text(f'CREATE TABLE IF NOT EXISTS {SCHEMA}."{rollup_name}" '
+                                    f'(LIKE {SCHEMA}."{table_name}" INCLUDING DEFAULTS)'))
+            connection.execute(text(f'CREATE INDEX IF NOT EXISTS "{rollup_name}_ts_idx" '
+                                    f'ON {SCHEMA}."{rollup_name}" ({PARTITION_COLUMN})'))
+
+    for name, day in partitions:
+        # one transaction per partition so a failure only leaves that day behind
+        with engine.begin() as connection:
+            connection.execute(text(f'INSERT INTO {SCHEMA}."{rollup_name}" '
+                                    f'SELECT * FROM {SCHEMA}."{name}" '
+                                    f'WHERE {PARTITION_COLUMN} = (SELECT max({PARTITION_COLUMN}) FROM {SCHEMA}."{name}")'))
+            connection.execute(text(f'DROP TABLE {SCHEMA}."{name}"'))
+        logger.info(f"Compacted partition {name} ({day}) into {rollup_name}")
+        dropped.append(name)
+    return dropped
+
+
+def convert_legacy_table(engine: Engine, table_name: str) -> bool:
+    """
+    Rewrite an existing plain prun_data.<table_name> into a partitioned table, one partition per day.
+    Runs in a single transaction. Rows without a collection timestamp cannot be partitioned, when there are
+    any the original table is kept as prun_data.<table_name>_legacy instead of being dropped.
+    :return: True if the table was converted
+    """
+    legacy_name = f"{table_name}{LEGACY_SUFFIX}"
+    with engine.begin() as connection:
+        if _relation_kind(connection, table_name) != "r":
+            return False
+        logger.warning(f"Converting {SCHEMA}.{table_name} to a partitioned table")
+        connection.execute(text(f'ALTER TABLE {SCHEMA}."{table_name}" RENAME TO "{legacy_name}"'))
+        connection.execute(text(f'CREATE TABLE {SCHEMA}."{table_name}" '
+                                f'(LIKE {SCHEMA}."{legacy_name}" INCLUDING DEFAULTS) '
+                                f'PARTITION BY RANGE ({PARTITION_COLUMN})'))
+        days = connection.execute(text(f"SELECT DISTINCT ({PARTITION_COLUMN} AT TIME ZONE 'UTC')::date "
+                                        f'FROM {SCHEMA}."{legacy_name}" WHERE {PARTITION_COLUMN} IS NOT NULL'))
+        for (day,) in days.all():
+            ensure_partition(connection, table_name, day)
+        connection.execute(text(f'INSERT INTO {SCHEMA}."{table_name}" '
+                                f'SELECT * FROM {SCHEMA}."{legacy_name}" WHERE {PARTITION_COLUMN} IS NOT NULL'))
+        columns = connection.execute(text("SELECT column_name FROM information_schema.columns "
+                                          "WHERE table_schema = :schema AND table_name = :name"),
+                                     {"schema": SCHEMA, "name": table_name}).scalars().all()
+        _create_indexes(connection, table_name, columns)
+        unpartitioned = connection.execute(text(f'SELECT count(*) FROM {SCHEMA}."{legacy_name}" '
+                                                f'WHERE {PARTITION_COLUMN} IS NULL')).scalar()
+        if unpartitioned:
+            logger.warning(f"{unpartitioned} rows of {SCHEMA}.{table_name} have no {PARTITION_COLUMN}, "
+                           f"keeping {SCHEMA}.{legacy_name}")
+        else:
+            connection.execute(text(f'DROP TABLE {SCHEMA}."{legacy_name}"'))
+    return True
+
+
+def managed_tables(engine: Engine) -> list[str]:
+    """
+    Raw tables of prun_data handled by retention: every temporary_df_hold_* table that is not a partition,
+    a rollup or a kept legacy copy
+    """
+    stmt = text("SELECT c.relname FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = :schema AND c.relkind IN ('r', 'p') AND NOT c.relispartition "
+                "AND c.relname LIKE 'temporary\\_df\\_hold\\_%' ORDER BY c.relname")
+    with engine.connect() as connection:
+        names = connection.execute(stmt, {"schema": SCHEMA}).scalars().all()
+    return [name for name in names if not name.endswith((ROLLUP_SUFFIX, LEGACY_SUFFIX))]
+
+
+def main(argv=None) -> int:
+    """
+    Retention job, run outside the API with the writer credentials, e.g. from a scheduled task:
+        python -m core.partitions compact [--days N] [--convert-legacy] [--table NAME ...]
+    """
+    import argparse
+
+    from core.database import get_engine, writer_url
+
+    parser = argparse.ArgumentParser(prog="python -m core.partitions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact = commands.add_parser("compact", help="compact raw partitions older than the retention horizon")
+    compact.add_argument("--days", type=int, default=None, help="retention horizon, defaults to PRUN_RETENTION_DAYS")
+    compact.add_argument("--convert-legacy", action="store_true",
+                         help="first convert plain tables into partitioned ones")
+    compact.add_argument("--table", action="append", dest="tables", help="table to handle, all by default")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    engine = get_engine(writer_url())
+    if engine.dialect.name != "postgresql":
+        logger.error(f"Retention needs PostgreSQL, not {engine.dialect.name}")
+        return 1
+
+    for table_name in args.tables or managed_tables(engine):
+        if args.convert_legacy and convert_legacy_table(engine, table_name):
+            logger.info(f"Converted {table_name}")
+        dropped = compact_partitions(engine, table_name, args.days)
+        logger.info(f"{table_name}: {len(dropped)} partitions compacted")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,37 @@
+import importlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# libraries the report and analytics routes import on first use
+HEAVY_MODULES = ["numpy", "pandas", "pyarrow", "matplotlib.pyplot", "seaborn", "core.analytics"]
+
+
+def warm_up(modules: list[str] = HEAVY_MODULES) -> dict[str, float]:
+    """
+    Import the heavy libraries ahead of the first report or analytics request
+    :return: seconds spent per module
+    """
+    timings = {}
+    for module in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning(f"Could not warm up {module}: {e}")
+            continue
+        timings[module] = time.perf_counter() - start
+    logger.info(f"Warm-up imports done in {sum(timings.values()):.2f}s: {timings}")
+    return timings
+
+
+def start_warm_up() -> None:
+    """
+    Startup hook: with WARMUP_IMPORTS=1 the heavy libraries are imported in a background thread once the app
+    is serving, trading some memory per worker for a fast first report
+    """
+    if os.environ.get("WARMUP_IMPORTS") == "1":
+        threading.Thread(target=warm_up, name="warm-up-imports", daemon=True).start()
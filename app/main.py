@@ -1,17 +1,15 @@
 # Standard library imports
 import os
-from datetime import datetime, timedelta, timezone
-from io import StringIO
+from datetime import datetime, timezone
 import logging
 
 import psycopg2
 from typing import Annotated
 
 # Third-party imports
-import pandas as pd
 import sqlalchemy
+from sqlalchemy.engine import make_url
 import httpx
-from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, WebSocketException, status, Response, Depends
 from fastapi.responses import RedirectResponse
 from fastapi.openapi.utils import get_openapi
@@ -19,33 +17,70 @@ from fastapi.security import OAuth2PasswordBearer
 # import redis
 
 # routes imports, routes is a fast api module that should contain a file named tables.py where a router is defined
-from routes import tables, users, reports
+from routes import tables, users, reports, analytics, events
+from core.database import get_engine, writer_url
+from core import ingestion
+from core.events import notify, start_listener, stop_listener
+from core.logging_config import configure_logging
+from core.metrics import INGESTION_DURATION, MetricsMiddleware, metrics_response
+from core.warmup import start_warm_up
 
 app = FastAPI()
 
 app.include_router(tables.router)
 app.include_router(users.router)
 app.include_router(reports.router)
+app.include_router(analytics.router)
+app.include_router(events.router)
+app.add_middleware(MetricsMiddleware)
+app.add_event_handler("startup", start_warm_up)
+app.add_event_handler("startup", start_listener)
+app.add_event_handler("shutdown", stop_listener)
 
 # security
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-# logging
+# logging, every module logger goes through the background writer configured here
+configure_logging()
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-handler = logging.FileHandler("log.log")
-handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
 logger.info("Logging started")
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(formatter)
-logger.addHandler(stream_handler)
 
 #TODO: Update this to internal railway network when releasing
+# upstream FIO api and public url of this api, overridable to run against a local mock
+fio_api_url = os.environ.get("FIO_API_URL", "https://rest.fnar.net")
+public_api_url = os.environ.get("PUBLIC_API_URL", "https://apiprojectbasic-production.up.railway.app")
 
 # rd = redis.Redis(host='localhost', port=6379, db=0)
 
+api_csv_list = ['/csv/buildings',
+                '/csv/buildingcosts',
+                '/csv/buildingworkforces',
+                '/csv/buildingrecipes',
+                '/csv/materials',
+                '/csv/prices',
+                '/csv/orders',
+                '/csv/bids',
+                '/csv/recipeinputs',
+                '/csv/recipeoutputs',
+                '/csv/planets',
+                '/csv/planetresources',
+                '/csv/planetproductionfees',
+                '/csv/planetdetail',
+                '/csv/systems',
+                '/csv/systemlinks',
+                '/csv/systemplanets',
+                '/csv/burnrate',
+                '/csv/workforce']
+
+
+def create_insert_engine() -> sqlalchemy.Engine:
+    """
+    Engine for the user allowed to write into prun_data
+    :return:
+    """
+    url = writer_url()
+    logger.info(f"Connecting to {make_url(url).render_as_string(hide_password=True)}")
+    return get_engine(url)
+
 
 ### OPEN API SCHEMA CUSTOMIZATION
 def custom_openapi():
@@ -79,6 +114,15 @@ async def root():
     return RedirectResponse('/docs')
 
 
+@app.get("/metrics", tags=['functional', 'debug'])
+async def metrics():
+    """
+    Prometheus metrics: request latency per route, requests in flight, database pool usage, ingestion stage
+    durations and row counts, report render times and cache hit ratios
+    """
+    return metrics_response()
+
+
 @app.get("/prun/update/database", tags=['not functional', 'gcp'])
 async def update_database(request_json: str = '{"type":"update db"}',
                           cloud_function_url: str = "https://us-central1-prun-409500.cloudfunctions.net/prun_orders"
@@ -148,90 +192,40 @@ async def save_current_prun_orders_volume(response: Response):
     This function helps in saving ALL current prun orders in a PostgreSQL database. Check with administrator for an
     export or api endpoint for accessing that data.
     """
-    api_csv_list = ['/csv/buildings',
-                    '/csv/buildingcosts',
-                    '/csv/buildingworkforces',
-                    '/csv/buildingrecipes',
-                    '/csv/materials',
-                    '/csv/prices',
-                    '/csv/orders',
-                    '/csv/bids',
-                    '/csv/recipeinputs',
-                    '/csv/recipeoutputs',
-                    '/csv/planets',
-                    '/csv/planetresources',
-                    '/csv/planetproductionfees',
-                    '/csv/planetdetail',
-                    '/csv/systems',
-                    '/csv/systemlinks',
-                    '/csv/systemplanets',
-                    '/csv/burnrate',
-                    '/csv/workforce']
-
     async def download_csv():
-        load_dotenv(dotenv_path=".env")
-        user = os.getenv("DB_INSERT_USERNAME")
-        password = os.getenv("DB_INSERT_USERNAME_PASSWORD")
-        hostname = os.getenv("DB_HOSTNAME")
-        database = os.getenv("DB_INSERT_DATABASE")
-        port = os.getenv("DB_PORT")
-
-        logger.info(f"Connecting to {hostname}:{port} with: {user} and {password}")
-        engine = sqlalchemy.create_engine(f'postgresql+psycopg2://{user}:{password}@{hostname}:{port}/{database}')
+        engine = create_insert_engine()
+        started = datetime.now(tz=timezone.utc)
+        loaded_tables = {}
         for api_root in api_csv_list:
-            api_link = "https://rest.fnar.net"
+            api_link = fio_api_url
             called_api_link = f"{api_link}{api_root}"
+            api_name = api_root.replace('/csv/', '')
             logger.info(f"API link: {called_api_link}")
-            async with httpx.AsyncClient(timeout=360) as client:
-                result = await client.get(called_api_link)
+            with INGESTION_DURATION.labels(api_name, "download").time():
+                async with httpx.AsyncClient(timeout=360) as client:
+                    result = await client.get(called_api_link)
 
             if result.status_code == 200:
                 logger.info(msg="Succesful API connection")
-                api_name = api_root.replace('/csv/', '')
 
                 # only proceed if the api works!
-                current_time = datetime.now().strftime("%d-%m-%Y-%H-%M")
-                data = StringIO(result.text)
-                destination_filename = f"{current_time}-{api_name}.csv"
-                dataframe = pd.read_csv(data)
-                pandas_type_dataframe = dataframe
-                # optional but in use now for my own purposes
-                timezone_gmt_plus_two = timezone(timedelta(hours=+2))
-                pandas_type_dataframe["collection_timestamp"] = datetime.now(tz=timezone_gmt_plus_two)
-                print(dataframe.head())
-                # serialize into string for easier archivation and later parsing down the road
-                # currently keeping it in html because CSV had massive problems
-                dataframe_string = dataframe.to_html()
-                data = [
-                    [destination_filename,
-                     dataframe_string]
-                ]
-                dataframe = pd.DataFrame(data,
-                                         columns=['csv_filename', 'csv_content']
-                                         )
-                print(dataframe)
-                print(dataframe.shape)
                 try:
-
-                    logger.info(msg="Dataframe uploaded to sql")
-                    pandas_type_dataframe.to_sql(
-                        name=f"temporary_df_hold_{api_name}",
-                        con=engine, schema="prun_data",
-                        if_exists="append",
-                        index=False
-                    )
-                    logger.info(msg=f"Dataframe uploaded to proper table for api {api_name}")
-
+                    loaded_tables[f"temporary_df_hold_{api_name}"] = ingestion.load_csv(engine, api_name, result.text)
                 except Exception as error:
-                    logger.error(f"Error while uploading to database for {destination_filename}, {error}")
-                    pass
+                    logger.error(f"Error while uploading to database for {api_name}, {error}")
             else:
                 logger.error(f"Investigate error during API call (non-200 answer from source) {called_api_link}")
+        try:
+            notify(engine, "ingestion", "ingestion", {"started": started.isoformat(),
+                                                      "finished": datetime.now(tz=timezone.utc).isoformat(),
+                                                      "tables": loaded_tables})
+        except Exception as error:
+            logger.error(f"Error while publishing the ingestion run event, {error}")
 
     try:
         await download_csv()
         async with httpx.AsyncClient() as client:
-            result = await client.post('https://apiprojectbasic-production.up.railway.app/new-update?title=Update'
+            result = await client.post(f'{public_api_url}/new-update?title=Update'
                                        '%20regarding%20database%21'
                                        '&message=The%20database%20is%20currently%20running%20a%20new%20update%20entry')
             logger.info(msg=f"{result.status_code}")
@@ -241,7 +235,7 @@ async def save_current_prun_orders_volume(response: Response):
         logger.error(f"Error downloading file, {e} occured!")
         async with httpx.AsyncClient() as client:
             result = await client.post(
-                'https://apiprojectbasic-production.up.railway.app/new-update?title=Update%20regarding%20database%21'
+                f'{public_api_url}/new-update?title=Update%20regarding%20database%21'
                 '&message=The%20database%20tried%20running%20a%20new%20update%20entry%20and'
                 '%20failed')
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -250,7 +244,7 @@ async def save_current_prun_orders_volume(response: Response):
     except WebSocketException as e:
         logger.error(f"Error downloading file, {e} occured!")
         async with httpx.AsyncClient() as client:
-            result = await client.post('https://apiprojectbasic-production.up.railway.app/new-update?title=Update'
+            result = await client.post(f'{public_api_url}/new-update?title=Update'
                                        '%20regarding%20database%21'
                                        '&message=The%20database%20tried%20running%20a%20new%20update%20entry%20and%20failed')
         response.status_code = status.HTTP_502_BAD_GATEWAY
@@ -258,12 +252,13 @@ async def save_current_prun_orders_volume(response: Response):
     except Exception as e:
         logger.error(f"Encountered unknown exception {e}")
         async with httpx.AsyncClient() as client:
-            result = await client.post('https://apiprojectbasic-production.up.railway.app/new-update?title=Update'
+            result = await client.post(f'{public_api_url}/new-update?title=Update'
                                        '%20regarding%20database%21'
                                        '&message=The%20database%20tried%20running%20a%20new%20update%20entry%20and%20failed')
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
         raise Exception
 
+
 # Database querying gets
 # @app.get("/prun/company_list", tags=['azure', 'not functional'])
 # async def get_company_list(token: Annotated[str, Depends(oauth2_scheme)]):
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+
+from typing import TYPE_CHECKING
+
+from fastapi import HTTPException
+from fastapi.routing import APIRouter
+
+from core.metrics import cache_lookup
+from core.partitions import PARTITION_COLUMN, recent_window_start
+from routes import reports
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+#logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+SORT_COLUMNS = {"spread_pct", "spread", "mid_change_pct", "bid_depth", "ask_depth"}
+
+# book summary and arbitrage table computed from the parquet cache, keyed by the modification time and inode
+# of the cached files (replaced atomically by /reports/initialize)
+_summary_cache: dict[tuple, tuple["pd.DataFrame", "pd.DataFrame"]] = {}
+
+
+def parquet_path(table_name: str) -> str:
+    # the cache written by /reports/initialize
+    return os.path.join(reports.DATA_DIR, 'parquet', f'{table_name}.parquet')
+
+
+def load_book_summary() -> tuple["pd.DataFrame", "pd.DataFrame"]:
+    """
+    Book summary and arbitrage table (ranked by profit_pct) over the parquet files written by
+    /reports/initialize, recomputed only when they change
+    :return:
+    """
+    bids_path = parquet_path("temporary_df_hold_bids")
+    orders_path = parquet_path("temporary_df_hold_orders")
+    key = tuple((stat.st_mtime_ns, stat.st_ino) for stat in (os.stat(bids_path), os.stat(orders_path)))
+    cache_lookup("book_summary", key in _summary_cache)
+    if key not in _summary_cache:
+        # pandas and pyarrow are only loaded once analytics are first requested
+        import pandas as pd
+
+        from core import analytics
+
+        logger.info(f"Computing book summary from {bids_path} and {orders_path}")
+        columns = ['MaterialTicker', 'ExchangeCode', 'ItemCount', 'ItemCost', PARTITION_COLUMN]
+        # the summary only compares the latest day with the previous one
+        recent = [(PARTITION_COLUMN, ">=", recent_window_start(2))]
+        bids = pd.read_parquet(bids_path, columns=columns, filters=recent)
+        orders = pd.read_parquet(orders_path, columns=columns, filters=recent)
+        if bids.empty and orders.empty:
+            logger.warning("No cached rows in the last two days, computing the book summary over the whole cache")
+            bids = pd.read_parquet(bids_path, columns=columns)
+            orders = pd.read_parquet(orders_path, columns=columns)
+        summary = analytics.book_summary(bids, orders)
+        opportunities = analytics.arbitrage(summary, bids, orders).sort_values("profit_pct", ascending=False)
+        _summary_cache.clear()
+        _summary_cache[key] = (summary, opportunities)
+    return _summary_cache[key]
+
+
+# plain def: the first request after a refresh recomputes the summary in the threadpool, not on the event loop
+@router.get("/analytics/spreads", tags=['functional', 'prun'])
+def get_spreads(tickers: str | None = None,
+                      sort_by: str = "spread_pct",
+                      limit: int | None = None):
+    """
+    Cross-exchange spread and arbitrage table, computed on the latest cached snapshot.
+    Run /reports/initialize first to refresh the cache.
+
+    `Example` : tickers=H2O,RAT,DW
+
+    :param tickers: comma separated material tickers, all materials if unset
+    :param sort_by: one of spread_pct, spread, mid_change_pct, bid_depth, ask_depth (descending)
+    :param limit: maximum number of rows returned per table
+    :return: per exchange book rows and per ticker arbitrage rows, ranked
+    """
+    if sort_by not in SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {sorted(SORT_COLUMNS)}")
+    try:
+        summary, opportunities = load_book_summary()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="No cached data, call /reports/initialize first")
+    except Exception as e:
+        logger.error(f"Error computing book summary: {e}")
+        raise HTTPException(status_code=500, detail="Error computing book summary")
+
+    if tickers:
+        selected = [ticker.strip().upper() for ticker in tickers.split(",")]
+        summary = summary[summary['MaterialTicker'].isin(selected)]
+        opportunities = opportunities[opportunities['MaterialTicker'].isin(selected)]
+    book = summary.sort_values(sort_by, ascending=False, na_position="last")
+    if limit is not None:
+        book = book.head(limit)
+        opportunities = opportunities.head(limit)
+
+    return {
+        "snapshot_date": str(summary['snapshot_date'].iloc[0]) if len(summary) else None,
+        "book": json.loads(book.drop(columns="snapshot_date").to_json(orient="records")),
+        "arbitrage": json.loads(opportunities.to_json(orient="records")),
+    }
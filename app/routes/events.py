@@ -0,0 +1,47 @@
+import asyncio
+import logging
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRouter
+
+from core.events import TOPICS, broker
+
+#logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+
+
+@router.get("/events", tags=['functional', 'prun'])
+async def get_events(request: Request, topics: str = "ingestion"):
+    """
+    Server-sent events stream announcing finished ingestion runs, so dashboards no longer need to poll.
+    ---
+    `ingestion` : a `table` event per table appended (rows, version: collection timestamp of the snapshot) and an `ingestion` event per finished run
+
+    `prices` : `prices` events with per ticker best bid/ask changes after bids and orders are ingested
+
+    `Example` : topics=ingestion,prices
+    """
+    requested = {topic.strip() for topic in topics.split(",") if topic.strip()}
+    if not requested or not requested <= TOPICS:
+        raise HTTPException(status_code=400, detail=f"topics must be a subset of {sorted(TOPICS)}")
+    subscription = broker.subscribe(requested)
+
+    async def stream():
+        try:
+            yield f"retry: {KEEPALIVE_SECONDS * 1000}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # comment line, keeps proxies from closing idle connections
+                    yield ": keepalive\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
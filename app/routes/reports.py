@@ -1,30 +1,35 @@
 import datetime
+import io
+import time
+from typing import TYPE_CHECKING
 
-import pandas as pd
 import sqlalchemy
 from fastapi import HTTPException
 from fastapi.responses import FileResponse
 from fastapi.routing import APIRouter
-from sqlalchemy.engine import create_engine
 from sqlalchemy import text, MetaData, Select, Table, select, Column, Integer, String, ForeignKey, Sequence
 from sqlalchemy.exc import IntegrityError, NoSuchTableError
 from pathlib import Path
 import os
 
-import seaborn as sns
-import matplotlib.pyplot as plt
+from core.database import get_engine, reader_url
+from core.logging_config import lazy
+from core.metrics import REPORT_RENDER, cache_lookup
+from core.partitions import PARTITION_COLUMN, history_source, recent_window_start
+
 import logging
-import sys
+
+# pandas, seaborn and matplotlib are imported by the functions using them, so that importing the router
+# (and starting the app) does not pay for the plotting stack. See core.warmup to preload them.
+if TYPE_CHECKING:
+    import pandas as pd
 
 #logging
 logger = logging.getLogger(__name__)
-handler = logging.StreamHandler(sys.stdout)
-handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s-%(lineno)d')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
 
 router = APIRouter()
+# root of the csv/parquet caches, overridable for benchmarks and local runs
+DATA_DIR = os.environ.get("PRUN_DATA_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
 def cleanup_processed_files():
@@ -35,30 +40,53 @@ def cleanup_processed_files():
     try:
         for file in os.listdir('./processed'):
             os.remove(f'./processed/{file}')
-        logging.info(f"Cleaned up processed files at {datetime.datetime.now()}")
+        logger.info(f"Cleaned up processed files at {datetime.datetime.now()}")
         return True
     except Exception as e:
-        logging.error(f"Error in cleanup: {e}")
+        logger.error(f"Error in cleanup: {e}")
         return False
 
 
-def load_data(filename) -> pd.DataFrame:
+def write_atomically(path: str, write) -> None:
+    """
+    Write a cache file through a temporary file renamed over path, so readers never see a partial file
+    :param path: destination
+    :param write: callable writing to the path it is given
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def dataframe_info(data: "pd.DataFrame") -> str:
+    buffer = io.StringIO()
+    data.info(buf=buffer)
+    return buffer.getvalue()
+
+
+def load_data(filename) -> "pd.DataFrame":
     """
     Load data from a file, must contain file extension
     EX: file.csv
     :param filename:
     :return:
     """
-    logging.info(f"Loading data from {filename} at {datetime.datetime.now()}")
+    import pandas as pd
+
+    logger.info(f"Loading data from {filename} at {datetime.datetime.now()}")
     file_type = filename.split('.')[-1]
-    logging.info(f"During loading, file type is {file_type}, the current directory is {os.getcwd()}")
-    data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), f'../{file_type}/{filename}'))
-    logging.info(f"Data path: {data_path}")
-    logging.warning(f"Checking if path exists {os.path.exists(data_path)}, at {os.getcwd()}")
+    logger.info(f"During loading, file type is {file_type}, the current directory is {os.getcwd()}")
+    data_path = os.path.join(DATA_DIR, file_type, filename)
+    logger.info(f"Data path: {data_path}")
+    logger.warning(f"Checking if path exists {os.path.exists(data_path)}, at {os.getcwd()}")
     data = pd.read_csv(data_path)
-    print(data.head())
-    print(data.info())
-    logging.info(f"Data finished loading from {filename} at {datetime.datetime.now()}")
+    logger.debug("Head of %s\n%s", filename, lazy(data.head))
+    logger.debug("Info of %s\n%s", filename, lazy(dataframe_info, data))
+    logger.info(f"Data finished loading from {filename} at {datetime.datetime.now()}")
     return data
 
 
@@ -74,23 +102,27 @@ def create_plots(array: list, array_tickers: list):
     :param array_tickers:
     :return:
     """
+    import pandas as pd
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+
     try:
         for df_name in array:
-            logging.warning(
+            logger.warning(
                 f"Processing {df_name} at {datetime.datetime.now()}, checking if path exists {os.path.exists(f'./processed')}")
             if os.path.exists(f"./processed"):
-                logging.info(f"Processed directory exists at {datetime.datetime.now()}")
+                logger.info(f"Processed directory exists at {datetime.datetime.now()}")
                 pass
             else:
-                logging.warning(f"Creating processed directory at {datetime.datetime.now()}")
+                logger.warning(f"Creating processed directory at {datetime.datetime.now()}")
                 # use os.path.abspath(os.path.join(os.path.dirname(__file__), f'{file_type}'))
                 os.mkdir(f"./processed")
                 os.mkdir(os.path.abspath(os.path.join(os.path.dirname(__file__), f'processed')))
             for material_ticker_filter in array_tickers:
-                logging.info(f"Processing {df_name} at {datetime.datetime.now()} for ticker {material_ticker_filter}")
+                render_started = time.perf_counter()
+                logger.info(f"Processing {df_name} at {datetime.datetime.now()} for ticker {material_ticker_filter}")
                 df: pd.DataFrame = load_data(f"{df_name}")
-                df.describe()
-                print(f"Printing {material_ticker_filter} data")
+                logger.debug(f"Printing {material_ticker_filter} data")
                 df = df[df['MaterialTicker'].str.fullmatch(material_ticker_filter) == True]
                 df['Total Cost'] = df['ItemCount'] * df['ItemCost']
                 df['Date'] = pd.to_datetime(df['collection_timestamp']).dt.date
@@ -99,7 +131,7 @@ def create_plots(array: list, array_tickers: list):
                     subset=['MaterialTicker', 'ExchangeCode', 'ItemCost', 'ItemCount', 'CompanyName', 'Date'],
                     keep="first")
                 df.to_csv(f'./processed/{material_ticker_filter}-{df_name}-with-suspected-duplicates.csv')
-                print(df)
+                logger.debug("Data with suspected duplicates\n%s", lazy(str, df))
                 df.drop(df[df['Suspected duplicate'] == True].index, inplace=True)
                 df.drop(df[df['ItemCost'] < 0].index, inplace=True)
                 df.drop(df[df['ItemCount'] < 0].index, inplace=True)
@@ -109,8 +141,8 @@ def create_plots(array: list, array_tickers: list):
                 logger.info(f"{os.curdir}")
                 grouped.to_csv(f'./processed/{material_ticker_filter}-{df_name}-simplified_grouped.csv')
                 df['Total Available'] = grouped['ItemCount'].sum()
-                logging.info(f"Grouped data for {material_ticker_filter} at {datetime.datetime.now()}")
-                logging.info(f"Plotting for {material_ticker_filter} at {datetime.datetime.now()}")
+                logger.info(f"Grouped data for {material_ticker_filter} at {datetime.datetime.now()}")
+                logger.info(f"Plotting for {material_ticker_filter} at {datetime.datetime.now()}")
 
                 plt.clf()
                 # Create a new figure instance for the next plot
@@ -128,7 +160,7 @@ def create_plots(array: list, array_tickers: list):
                              palette='viridis')
                 plt.title(f"Product analysis {material_ticker_filter}", fontsize=20, color='gray', fontweight='bold')
                 plt.xticks(rotation=90)  # Rotate x-axis labels again if needed
-                print("Applying annotations")
+                logger.debug("Applying annotations")
                 plt.annotate(
                     f"Source: {str(df_name)}",
                     xy=(0.9, 1.11),
@@ -163,18 +195,15 @@ def create_plots(array: list, array_tickers: list):
                     fontweight='bold'
                 )
 
-                print("Saving plot with material ticker filter")
+                logger.debug("Saving plot with material ticker filter")
                 plt.savefig(f'processed/{material_ticker_filter}-{df_name}.png')
-                print("Showing plot")
+                logger.debug("Showing plot")
                 # plt.show()
 
                 plt.clf()
 
                 plt.figure(figsize=(20, 10), dpi=120)
-                print("Dataframe: ")
-                print(df)
-                print("Grouped: ")
-                print(grouped)
+                logger.debug("Dataframe:\n%s\nGrouped:\n%s", lazy(str, df), lazy(str, grouped))
                 # Reapply the plot settings for the new figure
                 sns.lineplot(x='Date',
                              y='ItemCount',
@@ -224,26 +253,30 @@ def create_plots(array: list, array_tickers: list):
                     fontweight='bold'
                 )
                 # Rotate x-axis labels again if needed
-                print("Saving plot with material ticker filter")
+                logger.debug("Saving plot with material ticker filter")
                 plt.savefig(f'processed/{material_ticker_filter}-{df_name}.png')
-                print("Showing plot")
-                logging.info(f"Finished plotting for {material_ticker_filter} at {datetime.datetime.now()}")
+                logger.debug("Showing plot")
+                logger.info(f"Finished plotting for {material_ticker_filter} at {datetime.datetime.now()}")
+                REPORT_RENDER.labels(df_name).observe(time.perf_counter() - render_started)
                 # plt.show()
             del df
             plt.clf()
 
         return True
     except Exception as e:
-        logging.error(f"Error in plotting: {e}")
+        logger.error(f"Error in plotting: {e}")
         return False
 
 
 @router.get("/reports/initialize", tags=['functional', 'prun'], status_code=200, include_in_schema=False)
-async def initialize_tables():
+async def initialize_tables(days: int | None = None):
     """
     Not functional yet - in testing
+    :param days: only cache rows collected in the last given calendar days, reads every partition if unset
     :return:
     """
+    import pandas as pd
+
     try:
         mode = os.environ.get("MODE")
         sql_alchemy_postgres_user = os.environ.get("PG_USER")
@@ -259,8 +292,7 @@ async def initialize_tables():
         logger.warning(f"Current working directory: {os.getcwd()}")
         raise HTTPException(status_code=500, detail="Error getting environment variables")
     try:
-        engine = create_engine(
-            f"postgresql+psycopg2://{sql_alchemy_postgres_user}:{sql_alchemy_postgres_password}@{sql_alchemy_postgres_host}:{sql_alchemy_postgres_port}/{sql_alchemy_postgres_db}")
+        engine = get_engine(reader_url("PG_INTERNAL_DOMAIN", "PG_INTERNAL_PORT"))
         with engine.connect() as connection:
             query = "SELECT table_name FROM information_schema.tables WHERE table_schema = 'prun_data'"
             tables = pd.read_sql(query, engine)
@@ -271,26 +303,34 @@ async def initialize_tables():
 
             preferred_file_types = ['csv', 'parquet']
             for file_type in preferred_file_types:
-                if os.path.exists(os.path.abspath(os.path.join(os.path.dirname(__file__), f'{file_type}'))):
-                    logging.info(f"Directory {file_type} exists, returning {os.path.exists(f'./{file_type}')}")
-                    pass
+                # same directories load_data and the analytics routes read from
+                if os.path.exists(os.path.join(DATA_DIR, file_type)):
+                    logger.info(f"Directory {file_type} exists in {DATA_DIR}")
                 else:
-                    logging.warning(f"Creating directory {file_type}")
-                    os.mkdir(f"{file_type}")
-                    os.mkdir(os.path.abspath(os.path.join(os.path.dirname(__file__), f'{file_type}')))
-            logging.info(f"Reading tables: {tables_list}")
+                    logger.warning(f"Creating directory {file_type} in {DATA_DIR}")
+                    os.makedirs(os.path.join(DATA_DIR, file_type), exist_ok=True)
+            logger.info(f"Reading tables: {tables_list}")
             for table_name in tables_list:
                 try:
-                    logging.info(f"Reading table: {table_name}")
-                    df = pd.DataFrame(pd.read_sql(f'SELECT * FROM prun_data."{table_name}";', engine))
-                    logging.info(f"Table {table_name} read")
-                    df.to_csv(f"./csv/{table_name}.csv", index=False)
-                    df.to_parquet(f"./parquet/{table_name}.parquet", index=False, engine='pyarrow')
+                    logger.info(f"Reading table: {table_name}")
+                    # days compacted by retention are read back from the daily rollup
+                    source = history_source(connection, table_name)
+                    if days is None:
+                        df = pd.DataFrame(pd.read_sql(f'SELECT * FROM {source};', engine))
+                    else:
+                        df = pd.DataFrame(pd.read_sql(
+                            text(f'SELECT * FROM {source} WHERE {PARTITION_COLUMN} >= :start;'),
+                            engine, params={"start": recent_window_start(days)}))
+                    logger.info(f"Table {table_name} read")
+                    write_atomically(os.path.join(DATA_DIR, 'csv', f'{table_name}.csv'),
+                                     lambda path: df.to_csv(path, index=False))
+                    write_atomically(os.path.join(DATA_DIR, 'parquet', f'{table_name}.parquet'),
+                                     lambda path: df.to_parquet(path, index=False, engine='pyarrow'))
                 except Exception as e:
-                    logging.error(f"Error reading table: {table_name} with error: {e}")
+                    logger.error(f"Error reading table: {table_name} with error: {e}")
                     continue
 
-        logging.info("Successfuly initialized data")
+        logger.info("Successfuly initialized data")
     except Exception as e:
         logger.error(f"Error reading tables: {e}")
         raise HTTPException(status_code=500, detail="Error reading tables")
@@ -324,9 +364,7 @@ async def get_visual_report(item_ticker: str,
         logger.warning(f"Current working directory: {os.getcwd()}")
         raise HTTPException(status_code=500, detail="Error getting environment variables")
     item_ticker = item_ticker.upper()
-    current_dir = Path.cwd()
-    for item in current_dir.iterdir():
-        logger.info(item.name)
+    logger.debug("Working directory content: %s", lazy(lambda: [item.name for item in Path.cwd().iterdir()]))
 
     try:
         if refresh:
@@ -348,11 +386,13 @@ async def get_visual_report(item_ticker: str,
         except Exception as e:
             logger.warning(f"{e}, ./images exists")
             pass
-        if os.path.exists(f"./processed/{item_ticker}-temporary_df_hold_{data_focus}.csv.png"):
+        image_cached = os.path.exists(f"./processed/{item_ticker}-temporary_df_hold_{data_focus}.csv.png")
+        cache_lookup("report_image", image_cached)
+        if image_cached:
             logger.info(
                 f"Path status of path is {os.path.exists(f'./processed/{item_ticker}-temporary_df_hold_{data_focus}.csv.png')}")
             logger.warning(f"{Path.cwd()}")
-            logger.warning(f"{Path(f"Path already existed for {data_focus} {item_ticker}, therefore")}")
+            logger.warning(f"{Path(f'Path already existed for {data_focus} {item_ticker}, therefore')}")
             return FileResponse(f"./processed/{item_ticker}-temporary_df_hold_{data_focus}.csv.png",
                                 media_type="image/png")
         else:
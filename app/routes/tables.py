@@ -2,22 +2,17 @@ import sqlalchemy
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRouter
-from sqlalchemy.engine import create_engine
-from sqlalchemy import text, MetaData, Select, Table, select, Column, Integer, String, ForeignKey, Sequence
+from sqlalchemy import text, MetaData, Select, Table, select, union_all, Column, Integer, String, ForeignKey, Sequence
 from sqlalchemy.exc import IntegrityError, NoSuchTableError
 import os
-import plotly.express as px
+
+from core.database import get_engine, reader_url
+from core.partitions import PARTITION_COLUMN, ROLLUP_SUFFIX, has_rollup, recent_window_start
 
 import logging
-import sys
 
 #logging
 logger = logging.getLogger(__name__)
-handler = logging.StreamHandler(sys.stdout)
-handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
 
 
 
@@ -31,14 +26,13 @@ if mode == "dev":
     sql_alchemy_postgres_port = os.environ.get("PG_PORT")
     sql_alchemy_postgres_db = os.environ.get("PG_DATABASE")
     sql_alchemy_postgres_schema = os.environ.get("PG_SCHEMA")
-    logger.error(f"{sql_alchemy_postgres_db}")
-    logging.error(f"{sql_alchemy_postgres_db}")
+    logger.debug("Database in dev mode: %s", sql_alchemy_postgres_db)
 else:
     pass
 
 
 @router.get("/tables/{table_name}", tags=['functional', 'prun'])
-async def get_table(table_name: str):
+async def get_table(table_name: str, days: int | None = None):
     """
     Function in charge of getting tables. Use the table name to get the table.
     ---
@@ -46,6 +40,12 @@ async def get_table(table_name: str):
 
     `Example` : "Average Prices (All)" or _fact_companies_summary_dated
 
+    `days` : only return rows collected in the last given calendar days (UTC, today included), for tables with
+    a collection_timestamp. Partitioned tables then only scan the matching daily partitions.
+
+    Days compacted by retention are served from the table's `_daily` rollup (last snapshot of each day),
+    which can also be requested directly.
+
 
     """
     try:
@@ -55,17 +55,27 @@ async def get_table(table_name: str):
                      f"{sql_alchemy_postgres_schema},"
                      f"{sql_alchemy_postgres_db},"
                      f"{sql_alchemy_postgres_user}")
-        engine = create_engine(
-            f"postgresql://{sql_alchemy_postgres_user}:{sql_alchemy_postgres_password}@{sql_alchemy_postgres_host}:{sql_alchemy_postgres_port}/{sql_alchemy_postgres_db}")
+        engine = get_engine(reader_url())
         with engine.connect() as connection:
-            if len(table_name) > 38:
+            # rollups carry a suffix on top of the longest table names
+            if len(table_name.removesuffix(ROLLUP_SUFFIX)) > 38:
                 logger.info(f"Table name: {table_name}, with length of {len(table_name)}")
-                print(len(table_name))
                 raise HTTPException(status_code=400, detail="Table name too long")
             else:
                 pass
             requested_table_loader = Table(table_name, MetaData(), autoload_with=engine, schema='prun_data')
-            table = connection.execute(statement=select(requested_table_loader))
+            loaders = [requested_table_loader]
+            if not table_name.endswith(ROLLUP_SUFFIX) and has_rollup(connection, table_name):
+                loaders.insert(0, Table(f"{table_name}{ROLLUP_SUFFIX}", MetaData(), autoload_with=engine,
+                                        schema='prun_data'))
+            statements = []
+            for loader in loaders:
+                statement = select(loader)
+                if days is not None and PARTITION_COLUMN in loader.c:
+                    statement = statement.where(loader.c[PARTITION_COLUMN] >= recent_window_start(days))
+                statements.append(statement)
+            statement = statements[0] if len(statements) == 1 else union_all(*statements)
+            table = connection.execute(statement=statement)
 
             with open(f"{table_name}.csv", "w") as file:
                 # WRITE THE HEADER TO THE FILE TOO
@@ -90,8 +100,7 @@ async def get_list_tables():
                      f"{sql_alchemy_postgres_schema},"
                      f"{sql_alchemy_postgres_db},"
                      f"{sql_alchemy_postgres_user}")
-        engine = create_engine(
-            f"postgresql://{sql_alchemy_postgres_user}:{sql_alchemy_postgres_password}@{sql_alchemy_postgres_host}:{sql_alchemy_postgres_port}/{sql_alchemy_postgres_db}")
+        engine = get_engine(reader_url())
         with engine.connect() as connection:
             metadata = MetaData()
             # call procedure to refresh table due to limited rights of user
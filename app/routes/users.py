@@ -1,12 +1,10 @@
 import logging
-import sys
 
 import jwt
 from fastapi import APIRouter, Depends, HTTPException
 import os
 
 logger = logging.getLogger(__name__)
-handler = logging.StreamHandler(sys.stdout)
 
 router = APIRouter()
 mode = os.environ.get("MODE")
@@ -0,0 +1,64 @@
+"""
+Import-time report of the API, from `python -X importtime` in a fresh interpreter.
+
+Usage, from the repository root:
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --module routes.reports --top 30
+
+Prints the total import time of the module, the slowest imports by cumulative time and which of the heavy
+libraries (pandas, matplotlib, ...) ended up loaded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_LIBRARIES = ["numpy", "pandas", "pyarrow", "matplotlib", "seaborn", "plotly"]
+
+
+def import_times(module: str) -> tuple[list[tuple[str, int, int, int]], list[str]]:
+    """
+    Import module in a fresh interpreter
+    :return: (name, depth, self us, cumulative us) per imported module, and the heavy libraries loaded
+    """
+    probe = (f"import sys, json; import {module}; "
+             f"print(json.dumps([name for name in {HEAVY_LIBRARIES!r} if name in sys.modules]))")
+    env = {**os.environ, "PYTHONPATH": str(ROOT / "app"), "LOG_FILE": "", "LOG_STDOUT": "0"}
+    # run outside the repository, main writes its log file to the working directory
+    with tempfile.TemporaryDirectory() as directory:
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=directory, env=env,
+                                   capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((name.strip(), (len(name) - len(name.lstrip())) // 2, int(self_us), int(cumulative_us)))
+    return entries, json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to import, relative to app/")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    entries, heavy = import_times(args.module)
+    total = next(cumulative for name, _, _, cumulative in entries if name == args.module)
+    print(f"import {args.module}: {total / 1000:.1f} ms")
+    print(f"heavy libraries loaded: {', '.join(heavy) or 'none'}\n")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for name, depth, self_us, cumulative_us in sorted(entries, key=lambda entry: -entry[3])[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {'  ' * depth}{name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Micro-benchmarks for the hot paths of the API, on synthetic data and a local SQLite stand-in for prun_data.
+
+Usage, from the repository root:
+    python -m benchmarks.run --rows 10000 100000
+    python -m benchmarks.run --rows 1000000 --bench get_table ingestion
+    python -m benchmarks.run --rows 10000 --compare benchmarks/results/<previous>.json
+
+Each benchmark reports the best and median wall time over --repeat runs and the peak memory of one extra
+traced run. Results are written to benchmarks/results/<commit>-<time>.json for comparison between commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+sys.path.insert(0, str(ROOT / "app"))
+
+from benchmarks import synthetic  # noqa: E402
+
+
+class Workspace:
+    """
+    Temporary directory holding the csv/parquet caches, the SQLite database and whatever the code under test
+    writes to the working directory
+    """
+
+    def __init__(self, rows: int):
+        self.rows = rows
+        self.directory = Path(tempfile.mkdtemp(prefix="prun-bench-"))
+        self.database_url = f"sqlite:///{self.directory / 'prun.db'}"
+        (self.directory / "csv").mkdir()
+        (self.directory / "parquet").mkdir()
+        # create_plots also creates a processed directory next to its module when this one is missing
+        (self.directory / "processed").mkdir()
+        os.environ["MODE"] = "dev"
+        os.environ["PRUN_DATABASE_URL"] = self.database_url
+        os.environ["PRUN_DATA_DIR"] = str(self.directory)
+        self._frames = {}
+
+    def frame(self, name: str):
+        if name not in self._frames:
+            self._frames[name] = synthetic.GENERATORS[name](self.rows)
+        return self._frames[name]
+
+    def write_csv(self, name: str) -> str:
+        filename = f"temporary_df_hold_{name}.csv"
+        path = self.directory / "csv" / filename
+        if not path.exists():
+            self.frame(name).to_csv(path, index=False)
+        return filename
+
+    def write_table(self, name: str) -> str:
+        from core.database import get_engine
+
+        table_name = f"temporary_df_hold_{name}"
+        self.frame(name).to_sql(table_name, get_engine(self.database_url), schema="prun_data",
+                                if_exists="replace", index=False, chunksize=50000)
+        return table_name
+
+
+def bench_load_data(workspace: Workspace):
+    from routes import reports
+
+    reports.DATA_DIR = str(workspace.directory)
+    filename = workspace.write_csv("bids")
+    return lambda: reports.load_data(filename)
+
+
+def bench_create_plots(workspace: Workspace):
+    from routes import reports
+
+    reports.DATA_DIR = str(workspace.directory)
+    filename = workspace.write_csv("bids")
+
+    def run():
+        if not reports.create_plots([filename], synthetic.KNOWN_TICKERS[:3]):
+            raise RuntimeError("create_plots reported a failure")
+    return run
+
+
+def bench_get_table(workspace: Workspace):
+    from routes import tables
+
+    table_name = workspace.write_table("orders")
+
+    async def export():
+        response = await tables.get_table(table_name)
+        async for _ in response.body_iterator:
+            pass
+    return lambda: asyncio.run(export())
+
+
+def bench_ingestion(workspace: Workspace):
+    from core import ingestion
+    from core.database import get_engine
+
+    engine = get_engine(workspace.database_url)
+    csv_text = synthetic.fio_csv("orders", workspace.rows)
+    return lambda: ingestion.load_csv(engine, "orders", csv_text)
+
+
+def bench_book_summary(workspace: Workspace):
+    from core import analytics
+
+    bids, orders = workspace.frame("bids"), workspace.frame("orders")
+    return lambda: analytics.book_summary(bids, orders)
+
+
+BENCHMARKS = {
+    "load_data": bench_load_data,
+    "create_plots": bench_create_plots,
+    "get_table": bench_get_table,
+    "ingestion": bench_ingestion,
+    "book_summary": bench_book_summary,
+}
+
+
+def measure(run, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds_min": min(timings), "seconds_median": statistics.median(timings), "peak_mb": peak / 2 ** 20}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: list[dict], baseline_path: Path) -> None:
+    baseline = {(entry["bench"], entry["rows"]): entry for entry in json.loads(baseline_path.read_text())["results"]}
+    print(f"\nComparison with {baseline_path.name}")
+    print(f"{'benchmark':<14}{'rows':>10}{'time':>10}{'memory':>10}")
+    for entry in results:
+        previous = baseline.get((entry["bench"], entry["rows"]))
+        if previous is None or "error" in entry or "error" in previous:
+            continue
+        print(f"{entry['bench']:<14}{entry['rows']:>10}"
+              f"{entry['seconds_min'] / previous['seconds_min']:>9.2f}x"
+              f"{entry['peak_mb'] / max(previous['peak_mb'], 1e-9):>9.2f}x")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000], help="dataset sizes, 10k to 10M")
+    parser.add_argument("--bench", nargs="+", choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", type=Path, help="previous results file")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    # same background logging as the API, written nowhere so it does not pollute the report
+    os.environ.setdefault("LOG_FILE", os.devnull)
+    os.environ.setdefault("LOG_STDOUT", "0")
+    from core.logging_config import configure_logging
+    configure_logging()
+
+    results = []
+    cwd = os.getcwd()
+    for rows in args.rows:
+        workspace = Workspace(rows)
+        os.chdir(workspace.directory)
+        try:
+            for name in args.bench:
+                entry = {"bench": name, "rows": rows}
+                try:
+                    run = BENCHMARKS[name](workspace)
+                    entry.update(measure(run, args.repeat))
+                    print(f"{name:<14}{rows:>10} rows  {entry['seconds_min']:.4f}s min  "
+                          f"{entry['seconds_median']:.4f}s median  {entry['peak_mb']:.1f} MB peak")
+                except Exception as e:
+                    entry["error"] = f"{type(e).__name__}: {e}"
+                    print(f"{name:<14}{rows:>10} rows  failed, {entry['error']}")
+                results.append(entry)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workspace.directory, ignore_errors=True)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"{git_commit()}-{datetime.now():%Y%m%d-%H%M%S}.json"
+        output.write_text(json.dumps({"commit": git_commit(), "created": datetime.now().isoformat(),
+                                      "python": platform.python_version(), "platform": platform.platform(),
+                                      "results": results}, indent=2))
+        print(f"\nSaved {output.relative_to(ROOT)}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Synthetic datasets shaped like the FIO csv exports (https://doc.fnar.net) and the temporary_df_hold_* tables.
+Everything is generated offline from a seed, so runs are comparable between commits.
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+EXCHANGES = ["AI1", "CI1", "CI2", "IC1", "NC1", "NC2"]
+KNOWN_TICKERS = ["H2O", "LST", "O", "FEO", "FE", "COF", "NS", "PT", "OVE", "RAT", "DW", "C", "AL", "SI", "MCG"]
+
+
+def tickers(count: int = 300) -> list[str]:
+    """
+    The tickers used in the examples first, padded with generated ones up to roughly the game's material count
+    """
+    return KNOWN_TICKERS + [f"M{i:03d}" for i in range(max(count - len(KNOWN_TICKERS), 0))]
+
+
+def snapshot_timestamps(rows: int, rng: np.random.Generator, days: int, snapshots_per_day: int) -> pd.Series:
+    start = datetime.now(tz=timezone(timedelta(hours=+2))).replace(hour=0, minute=0, second=0, microsecond=0)
+    start -= timedelta(days=days - 1)
+    offsets = rng.integers(0, days * snapshots_per_day, rows) * (24 * 3600 // snapshots_per_day)
+    return pd.Series(pd.Timestamp(start) + pd.to_timedelta(np.sort(offsets), unit="s"), name="collection_timestamp")
+
+
+MARKET_SEED = 42
+
+
+def reference_prices(ticker_count: int) -> np.ndarray:
+    """
+    Price of each ticker on each exchange around which orders and bids are spread. Shared by both sides,
+    whatever their seed, so spreads and arbitrage computed on the synthetic tables are meaningful.
+    :return: array of shape (ticker_count, len(EXCHANGES))
+    """
+    rng = np.random.default_rng(MARKET_SEED)
+    return rng.lognormal(3, 1.2, ticker_count)[:, None] * rng.normal(1, 0.02, (ticker_count, len(EXCHANGES)))
+
+
+def generate_orders(rows: int, seed: int = 0, days: int = 30, snapshots_per_day: int = 4,
+                    ticker_count: int = 300, companies: int = 2000, side: str = "ask") -> pd.DataFrame:
+    """
+    Rows shaped like temporary_df_hold_orders / temporary_df_hold_bids: one row per order per ingestion run
+    :param rows: total row count, 10k to 10M
+    :param seed:
+    :param days: history length, one partition per day in production
+    :param snapshots_per_day: ingestion runs per day
+    :param ticker_count:
+    :param companies:
+    :param side: "ask" prices orders above the reference price, "bid" below it
+    :return:
+    """
+    rng = np.random.default_rng(seed)
+    material = pd.Categorical.from_codes(rng.integers(0, ticker_count, rows), categories=tickers(ticker_count))
+    exchange = pd.Categorical.from_codes(rng.integers(0, len(EXCHANGES), rows), categories=EXCHANGES)
+    company = rng.integers(0, companies, rows)
+    markup = rng.exponential(0.05, rows)
+    reference = reference_prices(ticker_count)[material.codes, exchange.codes]
+    item_cost = reference * (1 + markup if side == "ask" else 1 - markup)
+    return pd.DataFrame({
+        "MaterialTicker": material.astype(str),
+        "ExchangeCode": exchange.astype(str),
+        # categoricals keep one copy of each company string instead of one per row
+        "CompanyId": pd.Categorical.from_codes(company, categories=[f"{i:032x}" for i in range(companies)]),
+        "CompanyName": pd.Categorical.from_codes(company, categories=[f"Company {i}" for i in range(companies)]),
+        "CompanyCode": pd.Categorical.from_codes(company, categories=[f"C{i:04d}" for i in range(companies)]),
+        "ItemCount": rng.integers(1, 5000, rows),
+        "ItemCost": item_cost.round(2),
+        "collection_timestamp": snapshot_timestamps(rows, rng, days, snapshots_per_day),
+    })
+
+
+def generate_bids(rows: int, seed: int = 1, **kwargs) -> pd.DataFrame:
+    return generate_orders(rows, seed=seed, side="bid", **kwargs)
+
+
+def generate_prices(rows: int, seed: int = 2, days: int = 30, snapshots_per_day: int = 4) -> pd.DataFrame:
+    """
+    Rows shaped like temporary_df_hold_prices: one row per ticker and exchange per ingestion run
+    """
+    rng = np.random.default_rng(seed)
+    pairs = [(ticker, exchange) for ticker in tickers() for exchange in EXCHANGES]
+    index = np.arange(rows) % len(pairs)
+    mid = rng.lognormal(3, 1.2, len(pairs))[index] * rng.normal(1, 0.03, rows)
+    return pd.DataFrame({
+        "MaterialTicker": np.array([ticker for ticker, _ in pairs])[index],
+        "ExchangeCode": np.array([exchange for _, exchange in pairs])[index],
+        "MMBuy": (mid * 0.5).round(2),
+        "MMSell": (mid * 2).round(2),
+        "PriceAverage": mid.round(2),
+        "AskCount": rng.integers(0, 50, rows),
+        "Ask": (mid * 1.05).round(2),
+        "Supply": rng.integers(0, 100000, rows),
+        "BidCount": rng.integers(0, 50, rows),
+        "Bid": (mid * 0.95).round(2),
+        "Demand": rng.integers(0, 100000, rows),
+        "collection_timestamp": snapshot_timestamps(rows, rng, days, snapshots_per_day),
+    })
+
+
+GENERATORS = {
+    "orders": generate_orders,
+    "bids": generate_bids,
+    "prices": generate_prices,
+}
+
+
+def fio_csv(api_name: str, rows: int, seed: int = 0) -> str:
+    """
+    Body of a FIO /csv/<api_name> response: a single snapshot without collection_timestamp
+    """
+    return GENERATORS[api_name](rows, seed=seed).drop(columns="collection_timestamp").to_csv(index=False)
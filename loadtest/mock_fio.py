@@ -0,0 +1,62 @@
+"""
+Local stand-in for rest.fnar.net, also accepting the /new-update notifications sent after an ingestion.
+
+    MOCK_FIO_LATENCY_MS=200 MOCK_FIO_JITTER_MS=50 uvicorn loadtest.mock_fio:app --port 8100
+
+Configuration, through environment variables since uvicorn imports the module:
+    MOCK_FIO_RECORDINGS  directory of recorded <name>.csv responses, served as is when present
+    MOCK_FIO_ROWS        row count of the synthetic orders/bids/prices responses (default 10000)
+    MOCK_FIO_LATENCY_MS  delay before each response (default 0)
+    MOCK_FIO_JITTER_MS   uniform random extra delay (default 0)
+"""
+import asyncio
+import os
+import random
+from functools import lru_cache
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from benchmarks import synthetic
+
+app = FastAPI()
+
+RECORDINGS = os.environ.get("MOCK_FIO_RECORDINGS")
+ROWS = int(os.environ.get("MOCK_FIO_ROWS", 10000))
+LATENCY = float(os.environ.get("MOCK_FIO_LATENCY_MS", 0)) / 1000
+JITTER = float(os.environ.get("MOCK_FIO_JITTER_MS", 0)) / 1000
+
+# every endpoint downloaded by /prun_update_all, the ones without a generator get a small placeholder table
+CSV_NAMES = {"buildings", "buildingcosts", "buildingworkforces", "buildingrecipes", "materials", "prices", "orders",
+             "bids", "recipeinputs", "recipeoutputs", "planets", "planetresources", "planetproductionfees",
+             "planetdetail", "systems", "systemlinks", "systemplanets", "burnrate", "workforce"}
+
+
+@lru_cache(maxsize=None)
+def csv_body(name: str) -> str:
+    if RECORDINGS and (Path(RECORDINGS) / f"{name}.csv").exists():
+        return (Path(RECORDINGS) / f"{name}.csv").read_text()
+    if name in synthetic.GENERATORS:
+        return synthetic.fio_csv(name, ROWS)
+    return "\n".join(["Ticker,Name,Value"] + [f"{ticker},{name} {ticker},{i}"
+                                             for i, ticker in enumerate(synthetic.tickers())]) + "\n"
+
+
+async def upstream_delay() -> None:
+    delay = LATENCY + random.uniform(0, JITTER)
+    if delay:
+        await asyncio.sleep(delay)
+
+
+@app.get("/csv/{name}")
+async def get_csv(name: str):
+    if name not in CSV_NAMES:
+        raise HTTPException(status_code=404, detail="Unknown csv endpoint")
+    await upstream_delay()
+    return PlainTextResponse(csv_body(name), media_type="text/csv")
+
+
+@app.post("/new-update")
+async def new_update(title: str = "", message: str = ""):
+    return {"title": title, "message": message}